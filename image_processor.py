@@ -1,14 +1,248 @@
 """
 图片批量处理自动化脚本
-使用 Playwright 自动化 imagestool.com 进行格式转换和压缩
+默认使用 Pillow 在本地进行格式转换和压缩，
+也可以使用 Playwright 自动化 imagestool.com 在线处理
 """
 
+import io
 import os
-import time
-import glob
+import re
+import asyncio
 import shutil
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 仅使用在线工具时可以不安装 Pillow
+    Image = ImageOps = None
+
+
+# 目标格式 -> Pillow 编码器名称
+PIL_FORMATS = {
+    'webp': 'WEBP',
+    'png': 'PNG',
+    'jpg': 'JPEG',
+    'jpeg': 'JPEG',
+    'avif': 'AVIF',
+    'gif': 'GIF',
+    'bmp': 'BMP',
+    'tiff': 'TIFF',
+}
+
+# 编码器能直接写入的颜色模式（未列出的格式由 Pillow 自行转换），其他模式先转换为 RGB/RGBA
+PIL_MODES = {
+    'JPEG': {'L', 'RGB'},
+    'PNG': {'1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'I;16'},
+    'BMP': {'1', 'L', 'P', 'RGB', 'RGBA'},
+    'GIF': {'1', 'L', 'P', 'RGB', 'RGBA'},
+}
+
+# 支持多帧（动图）的编码器
+ANIMATED_FORMATS = {'WEBP', 'AVIF', 'PNG', 'GIF', 'TIFF'}
+
+# 编码时有画质参数的编码器，降低画质重新编码才能真正压缩
+QUALITY_FORMATS = {'WEBP', 'JPEG', 'AVIF'}
+
+# 默认需要再压缩的无损格式；webp/avif/jpg 编码时已经压缩过，再压缩收益很小
+LOSSLESS_FORMATS = {'png', 'bmp', 'tiff', 'gif'}
+
+# 本地能真正压缩的格式：有画质参数的格式降低画质重新编码，PNG 减少到 256 色；
+# bmp/tiff/gif 在本地重新编码不会变小
+LOCAL_COMPRESS_FORMATS = QUALITY_FORMATS | {'PNG'}
+
+# 本地处理时转换、压缩使用的画质
+CONVERT_QUALITY = 100
+COMPRESS_QUALITY = 80
+
+# 在线工具中单个文件的下载按钮（按文字匹配，与 image_processor.js 一致），排除“下载 Zip”和“全部下载”
+DOWNLOAD_BTN_SELECTOR = (
+    'button:has-text("下载"):not(:has-text("Zip")):not(:has-text("全部")), '
+    'a:has-text("下载"):not(:has-text("Zip")):not(:has-text("全部"))'
+)
+
+# 在线工具打包下载全部结果的按钮
+DOWNLOAD_ALL_BTN_SELECTOR = (
+    'button:has-text("下载 Zip"), button:has-text("全部下载"), .download-all, [class*="downloadAll"]'
+)
+
+# 在线工具的“清空”按钮，用于处理下一批前清掉上一批的文件
+CLEAR_BTN_SELECTOR = 'button:has-text("清空"), button:has-text("全部删除"), .clear-all, [class*="clearAll"]'
+
+# 工具页面不需要的资源：字体、界面图片、媒体以及统计/广告脚本
+# 样式表保留，按钮是否可见依赖页面样式
+BLOCKED_RESOURCE_TYPES = {'font', 'image', 'media'}
+BLOCKED_URL_PATTERN = re.compile(r'analytics|gtag|googletagmanager|doubleclick|googlesyndication|hotjar')
+
+# 解压时每次复制的块大小
+EXTRACT_BUFFER_SIZE = 1024 * 1024
+
+
+def _save_image(src: Path, dst: Path, quality: int):
+    """用 Pillow 重新编码图片，编码格式由 dst 的扩展名决定"""
+    pil_format = PIL_FORMATS[dst.suffix.lstrip('.').lower()]
+    
+    with Image.open(src) as img:
+        # 动图保存全部帧（各帧的颜色模式由编码器处理），否则按需转换颜色模式
+        save_all = getattr(img, 'is_animated', False) and pil_format in ANIMATED_FORMATS
+        icc_profile = img.info.get('icc_profile')
+        if not save_all:
+            # 按 EXIF 方向旋转像素（手机照片常见），并去掉方向标签，避免输出图片横躺
+            img = ImageOps.exif_transpose(img)
+            modes = PIL_MODES.get(pil_format)
+            if modes and img.mode not in modes:
+                # CMYK、灰度等模式的颜色配置文件不适用于转换后的 RGB 数据
+                if img.mode not in ('RGB', 'RGBA', 'P'):
+                    icc_profile = None
+                img = img.convert('RGBA' if 'RGBA' in modes and img.has_transparency_data else 'RGB')
+        
+        # 按格式选择编码参数，method/optimize 以速度换取更小的体积
+        if pil_format == 'WEBP':
+            options = {'quality': quality, 'method': 6}
+        elif pil_format == 'JPEG':
+            options = {'quality': quality, 'optimize': True}
+        elif pil_format == 'AVIF':
+            options = {'quality': quality}
+        elif pil_format == 'PNG':
+            options = {'optimize': True}
+        else:
+            options = {}
+        
+        # 保留颜色配置文件和其余 EXIF 信息
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        if img.info.get('exif'):
+            options['exif'] = img.info['exif']
+        
+        img.save(dst, format=pil_format, save_all=save_all, **options)
+    return dst
+
+
+def _quantize_png(src: Path, dst: Path):
+    """
+    把 PNG 减少到 256 色的调色板图片（与 pngquant/TinyPNG 相同的有损压缩）
+    
+    动图、已经是调色板/灰度的图片以及减色后没有变小的图片，保留原文件
+    """
+    data = None
+    with Image.open(src) as img:
+        if not getattr(img, 'is_animated', False) and img.mode not in ('1', 'L', 'P'):
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if img.has_transparency_data else 'RGB')
+            # FASTOCTREE 支持带透明通道的图片
+            quantized = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            buffer = io.BytesIO()
+            quantized.save(buffer, format='PNG', optimize=True,
+                           icc_profile=img.info.get('icc_profile'), exif=img.info.get('exif', b''))
+            if buffer.tell() < src.stat().st_size:
+                data = buffer.getvalue()
+    
+    if data is None:
+        shutil.copyfile(src, dst)
+    else:
+        dst.write_bytes(data)
+    return dst
+
+
+def _extract_zip(source, out_folder: Path) -> list:
+    """
+    解压 zip（文件路径或文件对象），返回解压出的文件
+    
+    逐个成员按固定大小的块复制，内存占用不随图片大小增长
+    """
+    extracted = []
+    with zipfile.ZipFile(source, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            name = Path(info.filename)
+            if info.is_dir() or name.is_absolute() or '..' in name.parts:
+                continue
+            
+            target = out_folder / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with zip_ref.open(info) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst, EXTRACT_BUFFER_SIZE)
+            extracted.append(target)
+    return extracted
+
+
+def _can_compress_locally(path: Path) -> bool:
+    """能否用 Pillow 降低画质重新编码来压缩该文件"""
+    if Image is None:
+        return False
+    
+    pil_format = PIL_FORMATS.get(path.suffix.lstrip('.').lower())
+    Image.init()
+    return pil_format in QUALITY_FORMATS and pil_format in Image.SAVE
+
+
+async def _block_unneeded_requests(route):
+    """拦截与处理流程无关的请求，加快页面达到 networkidle"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or BLOCKED_URL_PATTERN.search(request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class _PageSession:
+    """
+    常驻的工具页面
+    
+    只在第一次使用或切换地址时导航并等待加载完成，之后的批次用页面自带的清空按钮清掉上一批的文件，
+    没有清空按钮或清空失败时才重新加载页面
+    """
+    
+    def __init__(self, page):
+        self.page = page
+        self.url = None
+        self._cdp = None
+    
+    async def open(self, url: str):
+        """打开工具页面；已停留在该地址时只重置页面"""
+        if self.url == url:
+            if await self._clear():
+                return
+            await self.page.reload(timeout=60000)
+        else:
+            await self.page.goto(url, timeout=60000)
+        await self.page.wait_for_load_state('networkidle', timeout=30000)
+        
+        # 等待上传区域出现
+        await self.page.wait_for_selector('input[type="file"]', state='attached')
+        self.url = url
+    
+    async def _clear(self) -> bool:
+        """点击页面的清空按钮，上一批的下载按钮全部消失才算成功"""
+        clear_btn = self.page.locator(CLEAR_BTN_SELECTOR).first
+        if not await clear_btn.is_visible():
+            return False
+        
+        try:
+            await clear_btn.click()
+            await self.page.locator(DOWNLOAD_BTN_SELECTOR).first.wait_for(state='detached', timeout=5000)
+        except PlaywrightTimeoutError:
+            return False
+        return True
+    
+    async def set_input_files(self, file_paths: list):
+        """通过 CDP 的 DOM.setFileInputFiles 直接设置上传文件，省去 Playwright 的封装层"""
+        if self._cdp is None:
+            self._cdp = await self.page.context.new_cdp_session(self.page)
+        
+        # 页面导航后节点 ID 会失效，每次都从文档根节点重新查找
+        document = await self._cdp.send('DOM.getDocument', {'depth': 0})
+        node = await self._cdp.send('DOM.querySelector', {
+            'nodeId': document['root']['nodeId'],
+            # 页面上还有一个选择文件夹的 webkitdirectory 输入框，要跳过它
+            'selector': 'input[type="file"]:not([webkitdirectory])',
+        })
+        await self._cdp.send('DOM.setFileInputFiles', {
+            'files': [str(Path(path).resolve()) for path in file_paths],
+            'nodeId': node['nodeId'],
+        })
 
 
 class ImageProcessor:
@@ -20,6 +254,25 @@ class ImageProcessor:
             input_folder: 输入图片文件夹路径
             output_folder: 输出文件夹路径，默认在输入文件夹下创建 'processed' 子文件夹
         """
+        self.set_input_folder(input_folder, output_folder)
+        
+        # 支持的图片格式（小写扩展名）
+        self.supported_formats = {'.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp', '.tiff'}
+        
+        # 浏览器会话（web 模式下按需启动，跨批次、跨文件夹复用）
+        # _lanes 中每一项为 (context, 转换页面, 压缩页面)，页面为 _PageSession
+        self._playwright = None
+        self._browser = None
+        self._lanes = []
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+    
+    def set_input_folder(self, input_folder: str, output_folder: str = None):
+        """切换输入/输出文件夹，已启动的浏览器会继续复用"""
         self.input_folder = Path(input_folder)
         self.output_folder = Path(output_folder) if output_folder else self.input_folder / "processed"
         self.converted_folder = self.output_folder / "converted"
@@ -28,24 +281,137 @@ class ImageProcessor:
         # 创建输出目录
         self.converted_folder.mkdir(parents=True, exist_ok=True)
         self.compressed_folder.mkdir(parents=True, exist_ok=True)
+    
+    async def start(self, headless: bool = False):
+        """启动浏览器"""
+        if self._browser:
+            return
         
-        # 支持的图片格式
-        self.supported_formats = ['*.png', '*.jpg', '*.jpeg', '*.webp', '*.gif', '*.bmp', '*.tiff']
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=headless)
+    
+    async def _get_lanes(self, count: int) -> list:
+        """
+        获取 count 个浏览器上下文，不足时在同一浏览器内新建
+        
+        每个上下文带有转换、压缩两个常驻页面，上下文之间互不影响，可以并行处理不同批次
+        """
+        while len(self._lanes) < count:
+            context = await self._browser.new_context(
+                accept_downloads=True,
+                locale='zh-CN'
+            )
+            await context.route("**/*", _block_unneeded_requests)
+            self._lanes.append((
+                context,
+                _PageSession(await context.new_page()),
+                _PageSession(await context.new_page()),
+            ))
+        return self._lanes[:count]
+    
+    async def stop(self):
+        """关闭浏览器"""
+        if self._browser:
+            await self._browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+        
+        self._playwright = None
+        self._browser = None
+        self._lanes = []
+    
+    async def _save_download(self, download, save_path: Path):
+        """
+        保存浏览器下载，并删除浏览器的临时下载文件
         
+        上下文在整个会话中一直保持打开，Playwright 不会自动清理这些临时文件
+        """
+        try:
+            await download.save_as(save_path)
+        finally:
+            await download.delete()
+    
+    async def _extract_download(self, download, out_folder: Path) -> list:
+        """
+        解压 zip 下载，返回本次解压出的文件
+        
+        直接读取浏览器自己的临时下载文件，zip 不会另存到输出目录，解压后删除临时文件
+        """
+        try:
+            source = await download.path()
+            
+            # 解压在线程中进行，不阻塞其他浏览器上下文的上传和点击
+            return await asyncio.to_thread(_extract_zip, source, out_folder)
+        finally:
+            await download.delete()
+    
+    async def _download_each(self, page, out_folder: Path, skip: int = 0) -> list:
+        """
+        逐个点击下载按钮，返回保存的文件
+        
+        前 skip 个按钮属于之前的批次，不再下载；
+        每个文件的保存在后台进行，点击下一个按钮不必等上一个文件写完
+        """
+        saving = []
+        download_btns = (await page.locator(DOWNLOAD_BTN_SELECTOR).all())[skip:]
+        for idx, btn in enumerate(download_btns):
+            try:
+                async with page.expect_download(timeout=30000) as download_info:
+                    await btn.click()
+                download = await download_info.value
+                save_path = out_folder / download.suggested_filename
+                saving.append((idx, save_path, asyncio.create_task(self._save_download(download, save_path))))
+            except Exception as e:
+                print(f"  ⚠️ 下载第 {idx+1} 个文件失败: {e}")
+        
+        saved_files = []
+        for idx, save_path, task in saving:
+            try:
+                await task
+                saved_files.append(save_path)
+                print(f"  ✅ 已下载: {save_path.name}")
+            except Exception as e:
+                print(f"  ⚠️ 下载第 {idx+1} 个文件失败: {e}")
+        return saved_files
+    
     def get_images(self) -> list:
         """获取文件夹中所有图片文件"""
-        images = []
-        for fmt in self.supported_formats:
-            images.extend(self.input_folder.glob(fmt))
-            images.extend(self.input_folder.glob(fmt.upper()))
-        return sorted(images)
+        # 只遍历一次目录，按扩展名过滤（不区分大小写）
+        with os.scandir(self.input_folder) as entries:
+            images = [
+                Path(entry.path) for entry in entries
+                if os.path.splitext(entry.name)[1].lower() in self.supported_formats and entry.is_file()
+            ]
+        images.sort()
+        return images
+    
+    @staticmethod
+    def _iter_batches(images: list, batch_size: int, max_batch_bytes: int):
+        """按顺序将图片打包成批，每批不超过 batch_size 张且总大小不超过 max_batch_bytes（单张超限时独占一批）"""
+        batch = []
+        batch_bytes = 0
+        for img in images:
+            size = img.stat().st_size
+            if batch and (len(batch) >= batch_size or batch_bytes + size > max_batch_bytes):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(img)
+            batch_bytes += size
+        
+        if batch:
+            yield batch
     
-    def run(self, 
+    async def run(self, 
             target_format: str = "webp",
             convert_url: str = "https://to.imagestool.com/",
             compress_url: str = "https://imagestool.com/compress-image",
             headless: bool = False,
-            batch_size: int = 10):
+            batch_size: int = 10,
+            backend: str = "local",
+            parallelism: int = 4,
+            max_batch_bytes: int = 50 * 1024 * 1024,
+            enable_compress: bool = None):
         """
         运行自动化处理流程
         
@@ -54,205 +420,268 @@ class ImageProcessor:
             convert_url: 格式转换页面URL
             compress_url: 图片压缩页面URL
             headless: 是否无头模式运行（不显示浏览器窗口）
-            batch_size: 每批处理的图片数量
+            batch_size: 每批最多处理的图片数量
+            backend: 处理方式，"local" 使用 Pillow 本地处理，"web" 使用浏览器操作在线工具
+                （浏览器启动后会一直复用，需调用 stop() 或使用 async with 语句关闭）
+            parallelism: web 模式下并行处理批次的浏览器上下文数量
+            max_batch_bytes: 每批图片的总大小上限（字节）
+            enable_compress: 转换后是否再压缩，默认只对无损格式 (png, bmp, tiff, gif) 压缩；
+                本地处理时 png 减少到 256 色压缩，bmp/tiff/gif 无法在本地压缩，会跳过压缩步骤
         """
         images = self.get_images()
         if not images:
             print(f"❌ 在 {self.input_folder} 中没有找到图片文件")
             return
         
+        if (backend == "local" and enable_compress is not False
+                and PIL_FORMATS.get(target_format.lower()) not in LOCAL_COMPRESS_FORMATS):
+            # 只有明确要求压缩时才提示，默认情况下直接跳过
+            if enable_compress:
+                print(f"⚠️ 本地无法压缩 {target_format} 格式")
+            enable_compress = False
+        if enable_compress is None:
+            enable_compress = target_format.lower() in LOSSLESS_FORMATS
+        
         print(f"📁 找到 {len(images)} 张图片待处理")
         print(f"🎯 目标格式: {target_format}")
         print(f"📂 转换后保存到: {self.converted_folder}")
-        print(f"📂 压缩后保存到: {self.compressed_folder}")
+        if enable_compress:
+            print(f"📂 压缩后保存到: {self.compressed_folder}")
+        else:
+            print("⏭️ 跳过压缩步骤")
         print("-" * 50)
         
-        with sync_playwright() as p:
-            # 启动浏览器
-            browser = p.chromium.launch(
-                headless=headless,
-                downloads_path=str(self.output_folder)
-            )
-            context = browser.new_context(
-                accept_downloads=True,
-                locale='zh-CN'
-            )
+        batches = list(self._iter_batches(images, batch_size, max_batch_bytes))
+        
+        # 同名不同扩展名的图片（如 a.png 和 a.jpg）转换后会重名；按小写比较以兼容 Windows
+        stem_counts = Counter(img.stem.lower() for img in images)
+        duplicate_stems = {stem for stem, count in stem_counts.items() if count > 1}
+        
+        if backend == "local":
+            if Image is None:
+                print("❌ 本地处理需要安装 Pillow: pip install Pillow")
+                return
             
-            # 分批处理图片
-            for i in range(0, len(images), batch_size):
-                batch = images[i:i + batch_size]
-                print(f"\n🔄 处理第 {i//batch_size + 1} 批 ({len(batch)} 张图片)...")
-                
-                # 步骤1: 格式转换
-                converted_files = self._convert_format(
-                    context, batch, target_format, convert_url
-                )
+            for batch_no, batch in enumerate(batches, 1):
+                print(f"\n🔄 处理第 {batch_no} 批 ({len(batch)} 张图片)...")
                 
-                if converted_files:
-                    # 步骤2: 压缩图片
-                    self._compress_images(context, converted_files, compress_url)
-            
-            browser.close()
+                # 不再单独压缩时，转换直接按压缩画质编码，一次得到最终文件
+                quality = CONVERT_QUALITY if enable_compress else COMPRESS_QUALITY
+                converted_files = self._convert_format_local(batch, target_format, quality, duplicate_stems)
+                if converted_files and enable_compress:
+                    self._compress_images_local(converted_files)
+        else:
+            await self._run_web(batches, target_format, convert_url, compress_url,
+                                headless, parallelism, enable_compress)
         
         print("\n" + "=" * 50)
         print("✅ 所有图片处理完成！")
         print(f"📂 转换后的图片: {self.converted_folder}")
-        print(f"📂 压缩后的图片: {self.compressed_folder}")
+        if enable_compress:
+            print(f"📂 压缩后的图片: {self.compressed_folder}")
+    
+    async def _run_web(self, batches: list, target_format: str, convert_url: str, compress_url: str,
+                       headless: bool, parallelism: int, enable_compress: bool):
+        """使用 Playwright 操作在线工具处理所有批次"""
+        await self.start(headless)
+        
+        # 多个浏览器上下文从同一个队列中领取批次
+        batch_queue = asyncio.Queue()
+        for batch_no, batch in enumerate(batches, 1):
+            batch_queue.put_nowait((batch_no, batch))
+        
+        lanes = await self._get_lanes(max(1, min(batch_queue.qsize(), parallelism)))
+        print(f"🌐 使用 {len(lanes)} 个浏览器上下文并行处理")
+        
+        # 转换和压缩组成流水线：第 k 批压缩的同时，第 k+1 批已经开始转换
+        # 每个上下文最多缓冲一批待压缩的结果（双缓冲），转换端领先太多时会等待压缩端
+        compress_queue = asyncio.Queue(maxsize=len(lanes))
+        
+        async def convert_worker(session):
+            while not batch_queue.empty():
+                batch_no, batch = batch_queue.get_nowait()
+                print(f"\n🔄 处理第 {batch_no} 批 ({len(batch)} 张图片)...")
+                
+                # 步骤1: 格式转换，单批出错不影响后续批次
+                try:
+                    converted_files = await self._convert_format(
+                        session, batch, target_format, convert_url
+                    )
+                except Exception as e:
+                    print(f"  ❌ 转换过程出错: {e}")
+                    continue
+                if converted_files and enable_compress:
+                    await compress_queue.put(converted_files)
+        
+        async def compress_worker(session):
+            # 压缩端出错时也必须继续取队列，否则转换端会一直阻塞在 put() 上
+            while (converted_files := await compress_queue.get()) is not None:
+                try:
+                    # 步骤2: 压缩图片，有画质参数的格式 (webp/jpg/avif) 直接在本地压缩，省去一次上传下载；
+                    # 其他格式在本地重新编码不会变小，仍交给在线工具
+                    local_files = [f for f in converted_files if _can_compress_locally(f)]
+                    web_files = [f for f in converted_files if not _can_compress_locally(f)]
+                    
+                    if local_files:
+                        await asyncio.to_thread(self._compress_images_local, local_files)
+                    if web_files:
+                        await self._compress_images(session, web_files, compress_url)
+                except Exception as e:
+                    print(f"  ❌ 压缩过程出错: {e}")
+        
+        compress_tasks = [asyncio.create_task(compress_worker(session)) for _, _, session in lanes]
+        try:
+            await asyncio.gather(*(convert_worker(session) for _, session, _ in lanes))
+        finally:
+            # 通知压缩端结束；转换端异常退出时同样要发送，避免压缩端永远等待
+            for _ in compress_tasks:
+                await compress_queue.put(None)
+            await asyncio.gather(*compress_tasks)
     
-    def _convert_format(self, context, images: list, target_format: str, url: str) -> list:
+    def _convert_format_local(self, images: list, target_format: str, quality: int = CONVERT_QUALITY,
+                              duplicate_stems: set = frozenset()) -> list:
+        """
+        使用 Pillow 在本地进行格式转换
+        
+        duplicate_stems 中的文件名（小写，不含扩展名）对应多张源图片，如 a.png 和 a.jpg，
+        输出时保留源扩展名（a_png.webp、a_jpg.webp），避免写到同一个文件
+        """
+        print(f"  🔄 本地格式转换...")
+        target_format = target_format.lower()
+        if target_format not in PIL_FORMATS:
+            print(f"  ❌ 不支持的目标格式: {target_format}")
+            return []
+        
+        def convert(img: Path):
+            stem = img.stem
+            if stem.lower() in duplicate_stems:
+                stem = f"{stem}_{img.suffix.lstrip('.').lower()}"
+            try:
+                return _save_image(img, self.converted_folder / f"{stem}.{target_format}", quality)
+            except Exception as e:
+                print(f"  ⚠️ 转换 {img.name} 失败: {e}")
+                return None
+        
+        # Pillow 编解码时会释放 GIL，线程池即可并行
+        with ThreadPoolExecutor() as executor:
+            converted_files = [f for f in executor.map(convert, images) if f]
+        
+        print(f"  ✅ 格式转换完成，共 {len(converted_files)} 个文件")
+        return converted_files
+    
+    def _compress_images_local(self, images: list, quality: int = COMPRESS_QUALITY):
+        """使用 Pillow 在本地压缩图片，PNG 减少到 256 色，其他格式降低画质重新编码"""
+        print(f"  🗜️ 本地压缩...")
+        
+        def compress(img: Path):
+            try:
+                if img.suffix.lower() == '.png':
+                    return _quantize_png(img, self.compressed_folder / img.name)
+                return _save_image(img, self.compressed_folder / img.name, quality)
+            except Exception as e:
+                print(f"  ⚠️ 压缩 {img.name} 失败: {e}")
+                return None
+        
+        with ThreadPoolExecutor() as executor:
+            compressed_files = [f for f in executor.map(compress, images) if f]
+        
+        print(f"  ✅ 压缩完成，共 {len(compressed_files)} 个文件")
+    
+    async def _pipeline_stage(self, session, images: list, url: str, out_folder: Path,
+                              expected_ext: str = None, action: str = "处理") -> list:
+        """
+        在线工具的通用流程：打开页面、上传图片、等待处理完成、下载结果
+        
+        Args:
+            session: 使用的常驻页面（_PageSession）
+            images: 要上传的图片
+            url: 工具页面URL
+            out_folder: 下载结果保存的文件夹
+            expected_ext: 只返回该扩展名的解压结果（如 ".webp"），None 表示全部返回
+            action: 用于提示信息的步骤名称
+        
+        Returns:
+            本批下载得到的文件列表
+        """
+        page = session.page
+        await session.open(url)
+        
+        # 页面上可能还留有之前批次的下载按钮，本批的按钮排在它们之后
+        existing = await page.locator(DOWNLOAD_BTN_SELECTOR).count()
+        
+        # 上传所有图片
+        file_paths = [str(img) for img in images]
+        await session.set_input_files(file_paths)
+        
+        print(f"  ⏳ 等待{action}完成...")
+        
+        # 等待本批所有文件处理完成（每个文件出现一个下载按钮，等本批最后一个可见即可）
+        await page.locator(DOWNLOAD_BTN_SELECTOR).nth(existing + len(file_paths) - 1).wait_for(
+            state='visible', timeout=120000)
+        
+        # 点击全部下载按钮
+        download_all_btn = page.locator(DOWNLOAD_ALL_BTN_SELECTOR).first
+        
+        if not await download_all_btn.is_visible():
+            # 逐个下载
+            return await self._download_each(page, out_folder, skip=existing)
+        
+        async with page.expect_download(timeout=60000) as download_info:
+            await download_all_btn.click()
+        download = await download_info.value
+        
+        # 如果是zip文件，直接解压；否则保存下载的文件
+        if download.suggested_filename.lower().endswith('.zip'):
+            extracted = await self._extract_download(download, out_folder)
+            print(f"  ✅ 已下载并解压: {download.suggested_filename}")
+            
+            # 只取本批解压出的文件，不包含之前批次的输出
+            if expected_ext:
+                extracted = [f for f in extracted if f.suffix.lower() == expected_ext]
+            return extracted
+        
+        save_path = out_folder / download.suggested_filename
+        await self._save_download(download, save_path)
+        print(f"  ✅ 已下载: {save_path.name}")
+        return [save_path]
+    
+    async def _convert_format(self, session, images: list, target_format: str, url: str) -> list:
         """格式转换"""
         print(f"  📤 上传图片进行格式转换...")
-        page = context.new_page()
         converted_files = []
         
         try:
             # 构建转换URL（imagestool格式: to.imagestool.com/to-webp）
             convert_url = f"https://to.imagestool.com/to-{target_format.lower()}"
-            page.goto(convert_url, timeout=60000)
-            page.wait_for_load_state('networkidle', timeout=30000)
-            
-            # 等待上传区域出现
-            time.sleep(2)
-            
-            # 查找文件上传input
-            file_input = page.locator('input[type="file"]').first
-            
-            # 上传所有图片
-            file_paths = [str(img) for img in images]
-            file_input.set_input_files(file_paths)
-            
-            print(f"  ⏳ 等待转换完成...")
-            
-            # 等待转换完成（查找下载按钮或完成状态）
-            time.sleep(3)  # 给页面一些处理时间
-            
-            # 等待所有文件转换完成
-            page.wait_for_selector('.download-btn, [class*="download"], button:has-text("下载")', 
-                                   timeout=120000)
-            
-            # 额外等待确保所有文件处理完毕
-            time.sleep(2)
-            
-            # 点击全部下载按钮
-            download_all_btn = page.locator('button:has-text("全部下载"), .download-all, [class*="downloadAll"]').first
-            
-            if download_all_btn.is_visible():
-                with page.expect_download(timeout=60000) as download_info:
-                    download_all_btn.click()
-                download = download_info.value
-                
-                # 保存下载的文件
-                save_path = self.converted_folder / download.suggested_filename
-                download.save_as(save_path)
-                print(f"  ✅ 已下载: {save_path.name}")
-                
-                # 如果是zip文件，解压
-                if save_path.suffix.lower() == '.zip':
-                    import zipfile
-                    with zipfile.ZipFile(save_path, 'r') as zip_ref:
-                        zip_ref.extractall(self.converted_folder)
-                    os.remove(save_path)
-                    converted_files = list(self.converted_folder.glob(f'*.{target_format}'))
-                else:
-                    converted_files = [save_path]
-            else:
-                # 逐个下载
-                download_btns = page.locator('.download-btn, [class*="download"]:not([class*="all"])').all()
-                for idx, btn in enumerate(download_btns):
-                    try:
-                        with page.expect_download(timeout=30000) as download_info:
-                            btn.click()
-                        download = download_info.value
-                        save_path = self.converted_folder / download.suggested_filename
-                        download.save_as(save_path)
-                        converted_files.append(save_path)
-                        print(f"  ✅ 已下载: {save_path.name}")
-                    except Exception as e:
-                        print(f"  ⚠️ 下载第 {idx+1} 个文件失败: {e}")
-            
+            converted_files = await self._pipeline_stage(
+                session, images, convert_url, self.converted_folder,
+                expected_ext=f'.{target_format.lower()}', action="转换"
+            )
             print(f"  ✅ 格式转换完成，共 {len(converted_files)} 个文件")
             
         except PlaywrightTimeoutError as e:
             print(f"  ❌ 超时错误: {e}")
         except Exception as e:
             print(f"  ❌ 转换过程出错: {e}")
-        finally:
-            page.close()
         
         return converted_files
     
-    def _compress_images(self, context, images: list, url: str):
+    async def _compress_images(self, session, images: list, url: str):
         """压缩图片"""
         if not images:
             return
         
         print(f"  📤 上传图片进行压缩...")
-        page = context.new_page()
         
         try:
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state('networkidle', timeout=30000)
-            
-            time.sleep(2)
-            
-            # 查找文件上传input
-            file_input = page.locator('input[type="file"]').first
-            
-            # 上传图片
-            file_paths = [str(img) for img in images if img.exists()]
-            if not file_paths:
-                print("  ⚠️ 没有找到需要压缩的文件")
-                return
-                
-            file_input.set_input_files(file_paths)
-            
-            print(f"  ⏳ 等待压缩完成...")
-            time.sleep(3)
-            
-            # 等待压缩完成
-            page.wait_for_selector('.download-btn, [class*="download"], button:has-text("下载")', 
-                                   timeout=120000)
-            time.sleep(2)
-            
-            # 下载压缩后的文件
-            download_all_btn = page.locator('button:has-text("全部下载"), .download-all, [class*="downloadAll"]').first
-            
-            if download_all_btn.is_visible():
-                with page.expect_download(timeout=60000) as download_info:
-                    download_all_btn.click()
-                download = download_info.value
-                
-                save_path = self.compressed_folder / download.suggested_filename
-                download.save_as(save_path)
-                print(f"  ✅ 已下载: {save_path.name}")
-                
-                # 解压zip
-                if save_path.suffix.lower() == '.zip':
-                    import zipfile
-                    with zipfile.ZipFile(save_path, 'r') as zip_ref:
-                        zip_ref.extractall(self.compressed_folder)
-                    os.remove(save_path)
-            else:
-                download_btns = page.locator('.download-btn, [class*="download"]:not([class*="all"])').all()
-                for idx, btn in enumerate(download_btns):
-                    try:
-                        with page.expect_download(timeout=30000) as download_info:
-                            btn.click()
-                        download = download_info.value
-                        save_path = self.compressed_folder / download.suggested_filename
-                        download.save_as(save_path)
-                        print(f"  ✅ 已下载: {save_path.name}")
-                    except Exception as e:
-                        print(f"  ⚠️ 下载第 {idx+1} 个文件失败: {e}")
-            
+            # 文件刚由转换步骤写出，无需再逐个检查是否存在
+            await self._pipeline_stage(session, images, url, self.compressed_folder, action="压缩")
             print(f"  ✅ 压缩完成")
             
         except PlaywrightTimeoutError as e:
             print(f"  ❌ 超时错误: {e}")
         except Exception as e:
             print(f"  ❌ 压缩过程出错: {e}")
-        finally:
-            page.close()
 
 
 def select_folder():
@@ -274,7 +703,7 @@ def select_folder():
         return input("请手动输入文件夹路径: ").strip()
 
 
-def main():
+async def main():
     print("=" * 50)
     print("🖼️  图片批量处理工具")
     print("   格式转换 + 压缩一站式处理")
@@ -301,30 +730,41 @@ def main():
     format_map = {"1": "webp", "2": "png", "3": "jpg", "4": "avif"}
     target_format = format_map.get(format_choice, "webp")
     
+    # 选择处理方式
+    print("\n⚙️ 请选择处理方式:")
+    print("   1. 本地处理 (推荐，速度快)")
+    print("   2. 在线工具 (imagestool.com)")
+    
+    backend_choice = input("请输入数字 (默认1): ").strip() or "1"
+    backend = "web" if backend_choice == "2" else "local"
+    
     # 是否显示浏览器
-    show_browser = input("\n👁️ 是否显示浏览器窗口? (y/N): ").strip().lower() == 'y'
-    
-    # 创建处理器并运行
-    processor = ImageProcessor(input_folder)
-    processor.run(
-        target_format=target_format,
-        headless=not show_browser
-    )
-    
-    # 询问是否继续处理其他文件夹
-    while True:
-        again = input("\n🔄 是否处理其他文件夹? (y/N): ").strip().lower()
-        if again == 'y':
-            input_folder = select_folder()
-            if input_folder:
-                processor = ImageProcessor(input_folder)
-                processor.run(target_format=target_format, headless=not show_browser)
-        else:
-            break
+    show_browser = False
+    if backend == "web":
+        show_browser = input("\n👁️ 是否显示浏览器窗口? (y/N): ").strip().lower() == 'y'
+    
+    # 创建处理器并运行（浏览器在多个文件夹之间复用）
+    async with ImageProcessor(input_folder) as processor:
+        await processor.run(
+            target_format=target_format,
+            headless=not show_browser,
+            backend=backend
+        )
+        
+        # 询问是否继续处理其他文件夹
+        while True:
+            again = input("\n🔄 是否处理其他文件夹? (y/N): ").strip().lower()
+            if again == 'y':
+                input_folder = select_folder()
+                if input_folder:
+                    processor.set_input_folder(input_folder)
+                    await processor.run(target_format=target_format, headless=not show_browser, backend=backend)
+            else:
+                break
     
     print("\n👋 感谢使用，再见！")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
 